@@ -33,33 +33,18 @@ class CalibrationModule:
     def get_calibration_objects(self):
         """Get objects from the scene for calibration"""
         objects = []
-        object_id = 0
-        potential_targets = [f"/target[{i}]" for i in range(20)]
-        
-        for target_name in potential_targets:
-            try:
-                response = self.zmq.get_object_handle(target_name)
-                if response.get('returnCode') == 0:
-                    target_handle = response.get('handle')
-                    position_response = self.zmq.get_object_position(target_handle, -1)
-                    if position_response.get('returnCode') == 0:
-                        position = position_response.get('position')
-                        objects.append({
-                            "id": object_id,
-                            "handle": target_handle,
-                            "name": target_name,
-                            "position": position
-                        })
-                        object_id += 1
-                        logger.info(f"Found calibration target: {target_name} at position {position}")
-                else:
-                    if "[" in target_name and "target[0]" not in target_name:
-                        break
-            except Exception as e:
-                logger.error(f"Error accessing target {target_name}: {e}")
-                if "[" in target_name and "target[0]" not in target_name:
-                    break
-                continue
+        response = self.zmq.find_indexed_objects("/target", max_count=20)
+        if response.get('returnCode') == 0:
+            for object_id, found in enumerate(response.get('objects', [])):
+                objects.append({
+                    "id": object_id,
+                    "handle": found["handle"],
+                    "name": found["name"],
+                    "position": found["position"]
+                })
+                logger.info(f"Found calibration target: {found['name']} at position {found['position']}")
+        else:
+            logger.error(f"Error discovering calibration targets: {response.get('error')}")
         
         # Sort objects to create an effective calibration pattern
         if objects:
@@ -9,5 +9,5 @@ for i in range(5):  # Scan indices 0 through 4
     else:
         print(f"Camera index {i} NOT available")
 
-# Update first param of line 185 in gaze_tracker to the
+# Update the first param of cv2.VideoCapture in gaze_tracker.init_capture() to the
 # corresponding index
\ No newline at end of file
@@ -17,6 +17,24 @@ class GazeDurationTracker:
                 # Reset if gaze was broken
                 self.object_timers[object_id] = [now, now]
 
+    def update_many(self, object_id, count, dt, start=None):
+        """Apply `count` updates spaced `dt` seconds apart starting at `start` (default now) in one call"""
+        if count <= 0:
+            return
+        start = time.time() if start is None else start
+        last = start + (count - 1) * dt
+        timer = self.object_timers.get(object_id)
+        if timer is None or start - timer[1] >= self.max_idle_time:
+            timer = [start, start]
+            self.object_timers[object_id] = timer
+        timer[1] = start
+        if count > 1:
+            if dt < self.max_idle_time:
+                timer[1] = last
+            else:
+                # Every later update breaks the gaze, so only the last one counts
+                self.object_timers[object_id] = [last, last]
+
     def get_duration(self, object_id):
         now = time.time()
         if object_id not in self.object_timers:
@@ -26,6 +44,17 @@ class GazeDurationTracker:
             return 0.0
         return last_seen - start
 
+    def get_durations(self, object_ids):
+        now = time.time()
+        durations = {}
+        for object_id in object_ids:
+            timer = self.object_timers.get(object_id)
+            if timer is None or now - timer[1] > self.max_idle_time:
+                durations[object_id] = 0.0
+            else:
+                durations[object_id] = timer[1] - timer[0]
+        return durations
+
     def reset(self, object_id):
         if object_id in self.object_timers:
             del self.object_timers[object_id]
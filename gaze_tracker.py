@@ -1,8 +1,10 @@
 
 import time
+import queue
 import cv2
 import numpy as np
 from collections import deque
+from multiprocessing import shared_memory
 import logging
 from gaze_tracking import GazeTracking
 
@@ -174,48 +176,62 @@ class GazeFilter:
             "model_type": "polynomial-2"
         }
 
-# Initialize gaze tracking
-logger.info("Initializing webcam and gaze tracking...")
+# Camera frames are requested (and shared between processes) at this size
+FRAME_SHAPE = (480, 640, 3)
+
+# Capture state is created lazily by init_capture() so that only the process
+# that actually reads the webcam opens it and loads the dlib models
 gaze = None
 webcam = None
-gaze_filter = None
 
-try:
-    gaze = GazeTracking()
-    webcam = cv2.VideoCapture(0, cv2.CAP_DSHOW) #UPDATE THIS TO THE CAMERA INDICIE
-    
-    if not webcam.isOpened():
-        raise Exception("Webcam could not be opened")
-    
-    # Set webcam properties for better performance
-    webcam.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    webcam.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-    webcam.set(cv2.CAP_PROP_FPS, 30)
-    
-    # Initialize the improved gaze filter
-    gaze_filter = GazeFilter(window_size=10)
-    
-    logger.info("Webcam and gaze tracking successfully initialized")
-except Exception as e:
-    logger.error(f"Failed to initialize gaze tracking: {e}")
-    if webcam and webcam.isOpened():
-        webcam.release()
+# The filter holds the calibration model and lives in the process that calls process_gaze()
+gaze_filter = GazeFilter(window_size=10)
+
+def init_capture():
+    """Open the webcam and load the gaze tracking models (once). Returns True on success"""
+    global gaze, webcam
+    if gaze is not None and webcam is not None and webcam.isOpened():
+        return True
+
+    logger.info("Initializing webcam and gaze tracking...")
+    try:
+        gaze = GazeTracking()
+        webcam = cv2.VideoCapture(0, cv2.CAP_DSHOW) #UPDATE THIS TO THE CAMERA INDICIE
+        
+        if not webcam.isOpened():
+            raise Exception("Webcam could not be opened")
+        
+        # Set webcam properties for better performance
+        webcam.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_SHAPE[1])
+        webcam.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_SHAPE[0])
+        webcam.set(cv2.CAP_PROP_FPS, 30)
+        
+        logger.info("Webcam and gaze tracking successfully initialized")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to initialize gaze tracking: {e}")
+        if webcam and webcam.isOpened():
+            webcam.release()
+        gaze = None
+        webcam = None
+        return False
 
 def get_gaze_filter():
     """Get access to the gaze filter for calibration"""
     return gaze_filter
 
-def get_gaze_data():
+def capture_gaze():
     """
-    Capture and process webcam frame to extract gaze data
-    Returns tuple of (gaze_data_dict, annotated_frame) or (None, None) on failure
+    Capture a webcam frame and run pupil detection on it (no filtering or calibration)
+    Returns tuple of (raw_gaze_dict, annotated_frame) or (None, None) on failure
     """
     if gaze is None or webcam is None or not webcam.isOpened():
         logger.error("Gaze tracking not properly initialized")
         return None, None
         
     try:
-        # Capture frame
+        # Capture frame - OpenCV releases the GIL while read() waits on the camera,
+        # so other threads keep running during the blocking part of the capture
         ret, frame = webcam.read()
         if not ret or frame is None:
             logger.warning("Failed to capture frame from webcam")
@@ -224,106 +240,171 @@ def get_gaze_data():
         # Process with gaze tracking
         gaze.refresh(frame)
         
-        # Get raw gaze data
-        raw_h_ratio = gaze.horizontal_ratio()
-        raw_v_ratio = gaze.vertical_ratio()
-        
-        # Apply filtering if we have valid gaze data
-        filtered_h_ratio = raw_h_ratio
-        filtered_v_ratio = raw_v_ratio
-        calibrated_h_ratio = raw_h_ratio
-        calibrated_v_ratio = raw_v_ratio
-        is_calibrated = False
-        
-        if raw_h_ratio is not None and raw_v_ratio is not None:
-            # First step: Update the filter with raw gaze data and get filtered values
-            gaze_filter.update(raw_h_ratio, raw_v_ratio)
-            filtered_h, filtered_v = gaze_filter.get_filtered_ratios()
-            
-            # Only use filtered values if they're valid
-            if filtered_h is not None and filtered_v is not None:
-                filtered_h_ratio = filtered_h
-                filtered_v_ratio = filtered_v
-                
-                # Second step: Apply calibration if available
-                if gaze_filter.calibrated:
-                    calibrated_h, calibrated_v = gaze_filter.apply_calibration(filtered_h, filtered_v)
-                    calibrated_h_ratio = calibrated_h
-                    calibrated_v_ratio = calibrated_v
-                    is_calibrated = True
-
-        # Create frame with annotations
-        frame_annotated = gaze.annotated_frame()
-        
-        # Add custom visualization for eye gaze point
-        if raw_h_ratio is not None and raw_v_ratio is not None:
-            height, width = frame_annotated.shape[:2]
-            
-            # Draw raw gaze point (small yellow) - this is what we use for calibration
-            raw_x = int(raw_h_ratio * width)
-            raw_y = int(raw_v_ratio * height)
-            cv2.circle(frame_annotated, (raw_x, raw_y), 5, (0, 255, 255), 1)
-            
-            # Draw filtered gaze point (medium orange)
-            filtered_x = int(filtered_h_ratio * width)
-            filtered_y = int(filtered_v_ratio * height)
-            cv2.circle(frame_annotated, (filtered_x, filtered_y), 8, (0, 165, 255), 1)
-            
-            # Draw calibrated gaze point (large green) if calibration is active
-            if is_calibrated:
-                x = int(calibrated_h_ratio * width)
-                y = int(calibrated_v_ratio * height)
-                cv2.circle(frame_annotated, (x, y), 12, (0, 255, 0), 2)
-                
-                # Line connecting raw and calibrated points to show the transformation
-                cv2.line(frame_annotated, (raw_x, raw_y), (x, y), (0, 200, 200), 1)
-                
-                # Label the calibrated point
-                cv2.putText(frame_annotated, "Calibrated", (x + 10, y), 
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
-            
-            # Add calibration status
-            status_text = "CALIBRATED" if is_calibrated else "UNCALIBRATED"
-            status_color = (0, 255, 0) if is_calibrated else (0, 100, 255)
-            cv2.putText(frame_annotated, status_text, (10, 30), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, status_color, 2)
-            
-            # Add explanation of the circles
-            cv2.putText(frame_annotated, "Yellow: Raw    Orange: Filtered    Green: Calibrated", 
-                       (10, height - 20), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        
-        # Package gaze data for use by other components
-        gaze_data = {
-            # Calibrated values (or filtered if not calibrated)
-            "gaze_ratio_horizontal": calibrated_h_ratio,
-            "gaze_ratio_vertical": calibrated_v_ratio,
-            
-            # Raw values - important for calibration
-            "raw_ratio_horizontal": raw_h_ratio,
-            "raw_ratio_vertical": raw_v_ratio,
-            
-            # Filtered values (before calibration)
-            "filtered_ratio_horizontal": filtered_h_ratio,
-            "filtered_ratio_vertical": filtered_v_ratio,
-            
-            # Other gaze tracking data
+        raw_gaze = {
+            "raw_ratio_horizontal": gaze.horizontal_ratio(),
+            "raw_ratio_vertical": gaze.vertical_ratio(),
             "looking_left": gaze.is_left(),
             "looking_right": gaze.is_right(),
             "looking_center": gaze.is_center(),
             "pupils_located": gaze.pupils_located,
             "left_pupil": gaze.pupil_left_coords(),
             "right_pupil": gaze.pupil_right_coords(),
-            "calibrated": is_calibrated,
             "timestamp": time.time()
         }
-
-        return gaze_data, frame_annotated
+        return raw_gaze, gaze.annotated_frame()
         
     except Exception as e:
         logger.error(f"Error in gaze tracking: {e}")
         return None, None
 
+def process_gaze(raw_gaze, frame_annotated):
+    """
+    Filter and calibrate a raw gaze sample and draw the gaze points onto its frame
+    Returns tuple of (gaze_data_dict, annotated_frame)
+    """
+    # Get raw gaze data
+    raw_h_ratio = raw_gaze["raw_ratio_horizontal"]
+    raw_v_ratio = raw_gaze["raw_ratio_vertical"]
+    
+    # Apply filtering if we have valid gaze data
+    filtered_h_ratio = raw_h_ratio
+    filtered_v_ratio = raw_v_ratio
+    calibrated_h_ratio = raw_h_ratio
+    calibrated_v_ratio = raw_v_ratio
+    is_calibrated = False
+    
+    if raw_h_ratio is not None and raw_v_ratio is not None:
+        # First step: Update the filter with raw gaze data and get filtered values
+        gaze_filter.update(raw_h_ratio, raw_v_ratio)
+        filtered_h, filtered_v = gaze_filter.get_filtered_ratios()
+        
+        # Only use filtered values if they're valid
+        if filtered_h is not None and filtered_v is not None:
+            filtered_h_ratio = filtered_h
+            filtered_v_ratio = filtered_v
+            
+            # Second step: Apply calibration if available
+            if gaze_filter.calibrated:
+                calibrated_h, calibrated_v = gaze_filter.apply_calibration(filtered_h, filtered_v)
+                calibrated_h_ratio = calibrated_h
+                calibrated_v_ratio = calibrated_v
+                is_calibrated = True
+    
+    # Add custom visualization for eye gaze point
+    if raw_h_ratio is not None and raw_v_ratio is not None:
+        height, width = frame_annotated.shape[:2]
+        
+        # Draw raw gaze point (small yellow) - this is what we use for calibration
+        raw_x = int(raw_h_ratio * width)
+        raw_y = int(raw_v_ratio * height)
+        cv2.circle(frame_annotated, (raw_x, raw_y), 5, (0, 255, 255), 1)
+        
+        # Draw filtered gaze point (medium orange)
+        filtered_x = int(filtered_h_ratio * width)
+        filtered_y = int(filtered_v_ratio * height)
+        cv2.circle(frame_annotated, (filtered_x, filtered_y), 8, (0, 165, 255), 1)
+        
+        # Draw calibrated gaze point (large green) if calibration is active
+        if is_calibrated:
+            x = int(calibrated_h_ratio * width)
+            y = int(calibrated_v_ratio * height)
+            cv2.circle(frame_annotated, (x, y), 12, (0, 255, 0), 2)
+            
+            # Line connecting raw and calibrated points to show the transformation
+            cv2.line(frame_annotated, (raw_x, raw_y), (x, y), (0, 200, 200), 1)
+            
+            # Label the calibrated point
+            cv2.putText(frame_annotated, "Calibrated", (x + 10, y), 
+                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+        
+        # Add calibration status
+        status_text = "CALIBRATED" if is_calibrated else "UNCALIBRATED"
+        status_color = (0, 255, 0) if is_calibrated else (0, 100, 255)
+        cv2.putText(frame_annotated, status_text, (10, 30), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, status_color, 2)
+        
+        # Add explanation of the circles
+        cv2.putText(frame_annotated, "Yellow: Raw    Orange: Filtered    Green: Calibrated", 
+                   (10, height - 20), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    
+    # Package gaze data for use by other components
+    gaze_data = {
+        # Calibrated values (or filtered if not calibrated)
+        "gaze_ratio_horizontal": calibrated_h_ratio,
+        "gaze_ratio_vertical": calibrated_v_ratio,
+        
+        # Raw values - important for calibration
+        "raw_ratio_horizontal": raw_h_ratio,
+        "raw_ratio_vertical": raw_v_ratio,
+        
+        # Filtered values (before calibration)
+        "filtered_ratio_horizontal": filtered_h_ratio,
+        "filtered_ratio_vertical": filtered_v_ratio,
+        
+        # Other gaze tracking data
+        "looking_left": raw_gaze["looking_left"],
+        "looking_right": raw_gaze["looking_right"],
+        "looking_center": raw_gaze["looking_center"],
+        "pupils_located": raw_gaze["pupils_located"],
+        "left_pupil": raw_gaze["left_pupil"],
+        "right_pupil": raw_gaze["right_pupil"],
+        "calibrated": is_calibrated,
+        "timestamp": raw_gaze["timestamp"]
+    }
+
+    return gaze_data, frame_annotated
+
+def get_gaze_data():
+    """
+    Capture and process webcam frame to extract gaze data
+    Returns tuple of (gaze_data_dict, annotated_frame) or (None, None) on failure
+    """
+    if not init_capture():
+        return None, None
+    raw_gaze, frame_annotated = capture_gaze()
+    if raw_gaze is None:
+        return None, None
+    return process_gaze(raw_gaze, frame_annotated)
+
+def gaze_process(shm_name, frame_lock, raw_queue, stop_event):
+    """
+    Entry point of the capture process: pupil detection runs here, outside the main interpreter.
+    Each annotated frame is written into the shared memory block `shm_name` (FRAME_SHAPE, uint8)
+    and the matching raw gaze dict is then put on `raw_queue` (None when capture failed).
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    shared_frame = np.ndarray(FRAME_SHAPE, dtype=np.uint8, buffer=shm.buf)
+    try:
+        if not init_capture():
+            return
+        while not stop_event.is_set():
+            raw_gaze, frame_annotated = capture_gaze()
+            if raw_gaze is not None:
+                if frame_annotated.shape != FRAME_SHAPE:
+                    frame_annotated = cv2.resize(frame_annotated, (FRAME_SHAPE[1], FRAME_SHAPE[0]))
+                with frame_lock:
+                    np.copyto(shared_frame, frame_annotated)
+
+            # Keep only the newest sample in the queue
+            try:
+                raw_queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                raw_queue.put_nowait(raw_gaze)
+            except queue.Full:
+                pass
+
+            if raw_gaze is None:
+                time.sleep(0.033)  # Back off while the camera is unavailable
+    except KeyboardInterrupt:
+        pass
+    finally:
+        del shared_frame
+        shm.close()
+        close()
+
 def close():
     """Release resources"""
     logger.info("Closing gaze tracker resources")
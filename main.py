@@ -3,11 +3,14 @@ import time
 import cv2
 import numpy as np
 import threading
+import queue
+import multiprocessing as mp
+from multiprocessing import shared_memory
 import sys
 import win32gui
 import win32con
-from zmq_connection import ZMQConnection
-from gaze_tracker import get_gaze_data, get_gaze_filter, close as close_gaze_tracker
+from zmq_connection import ZMQConnection, SceneChangeListener
+from gaze_tracker import FRAME_SHAPE, gaze_process, process_gaze, get_gaze_filter, close as close_gaze_tracker
 from robot_controller import RobotController
 from q_learning_agent import GazeJoystickAgent
 from keyboard_input import KeyboardController
@@ -19,7 +22,17 @@ from calibration_module import CalibrationModule
 gaze_data = None
 frame = None
 running = True
-frame_lock = threading.Lock()
+# Gaze capture process state, created in main(): the newest raw sample arrives on
+# gaze_queue and its annotated frame is read from the shared memory block
+gaze_queue = None
+gaze_shm = None
+gaze_frame = None
+gaze_frame_lock = None
+# Newest frame for the render thread, and key presses it forwards back to the main loop
+render_queue = queue.Queue(maxsize=1)
+key_queue = queue.Queue()
+# Serializes HighGUI use between the render thread and the calibration window
+gui_lock = threading.Lock()
 
 def set_window_always_on_top(window_name):
     """Set an OpenCV window to be always on top"""
@@ -41,20 +54,66 @@ def set_window_always_on_top(window_name):
     print(f"Window '{window_name}' not found")
     return False
 
-def gaze_thread():
-    global gaze_data, frame, running
+def put_latest(q, item):
+    """Put item into a single-slot queue, dropping the previous item if it was not consumed yet"""
     try:
-        while running:
-            result = get_gaze_data()
-            if result:
-                new_gaze_data, new_frame = result
-                with frame_lock:
-                    gaze_data = new_gaze_data
-                    frame = new_frame
-            time.sleep(0.033)  # 33 fps
+        q.get_nowait()
+    except queue.Empty:
+        pass
+    q.put_nowait(item)
+
+def receive_gaze_data(block=True, timeout=0.1):
+    """Take the newest sample from the gaze process, keeping the previous one if none arrives"""
+    global gaze_data, frame
+    try:
+        raw_gaze = gaze_queue.get(block, timeout)
+    except queue.Empty:
+        return gaze_data, frame
+
+    if raw_gaze is None:
+        gaze_data, frame = None, None
+        return gaze_data, frame
+
+    with gaze_frame_lock:
+        current_frame = gaze_frame.copy()
+    try:
+        # Filtering and calibration stay in this process since calibration updates the filter
+        gaze_data, frame = process_gaze(raw_gaze, current_frame)
     except Exception as e:
-        print(f"[Gaze Thread] Exception: {e}")
-        running = False
+        print(f"Error processing gaze data: {e}")
+        gaze_data, frame = None, None
+    return gaze_data, frame
+
+def render_thread(help_img):
+    """Show the gaze and help windows off the main loop and forward key presses through key_queue"""
+    with gui_lock:
+        # The windows are created here so this thread's waitKey() pumps their events
+        cv2.namedWindow("Gaze Frame", cv2.WINDOW_NORMAL)
+        set_window_always_on_top("Gaze Frame")
+        
+        cv2.namedWindow("Keyboard Controls", cv2.WINDOW_NORMAL)
+        cv2.moveWindow("Keyboard Controls", 0, 0)  # Position at top-left
+        cv2.resizeWindow("Keyboard Controls", 300, 180)
+        set_window_always_on_top("Keyboard Controls")
+
+        # The help image never changes: upload it once and show it once, the window keeps its content
+        cv2.imshow("Keyboard Controls", cv2.UMat(help_img))
+
+    while running:
+        try:
+            current_frame = render_queue.get(timeout=0.03)
+        except queue.Empty:
+            current_frame = None
+
+        with gui_lock:
+            if current_frame is not None:
+                cv2.imshow("Gaze Frame", current_frame)
+            key = cv2.waitKey(1) & 0xFF
+        if key != 255:
+            key_queue.put(key)
+
+    cv2.destroyWindow("Gaze Frame")
+    cv2.destroyWindow("Keyboard Controls")
 
 def run_enhanced_calibration(calibration_module):
     """Run the enhanced calibration sequence that uses user's natural gaze as truth"""
@@ -68,11 +127,11 @@ def run_enhanced_calibration(calibration_module):
     set_window_always_on_top("Calibration")
     
     # Get frame size for overlay creation
-    with frame_lock:
-        if frame is not None:
-            frame_size = frame.shape[:2]
-        else:
-            frame_size = (480, 640)  # Default size
+    _, current_frame = receive_gaze_data()
+    if current_frame is not None:
+        frame_size = current_frame.shape[:2]
+    else:
+        frame_size = (480, 640)  # Default size
     
     # Get the gaze filter for calibration
     gaze_filter = get_gaze_filter()
@@ -86,27 +145,32 @@ def run_enhanced_calibration(calibration_module):
     # We'll monkey patch the function to return our global gaze_data
     from calibration_module import yield_gaze_data
     def get_current_gaze_data():
-        with frame_lock:
-            return gaze_data
+        return gaze_data
     
     # Monkey patch the yield_gaze_data function
     import types
     calibration_module.yield_gaze_data = types.MethodType(lambda self: get_current_gaze_data(), calibration_module)
     
+    # Buffers reused every step: blended output and a stand-in for a missing camera frame
+    combined_frame = np.empty((*frame_size, 3), dtype=np.uint8)
+    blank_frame = np.zeros((*frame_size, 3), dtype=np.uint8)
+    
     # Start the calibration sequence
     calibration_generator = calibration_module.run_calibration(frame_size)
     
     try:
         for target_obj, overlay, progress, wait_for_key in calibration_generator:
-            # Get current frame with gaze data
-            with frame_lock:
-                current_frame = frame.copy() if frame is not None else np.zeros((480, 640, 3), dtype=np.uint8)
+            # Get current frame with gaze data (non-blocking: waitKey below paces the loop).
+            # Each sample is a fresh array that is only read here, so no copy is needed.
+            _, current_frame = receive_gaze_data(block=False)
+            if current_frame is None:
+                current_frame = blank_frame
             
             # If we have a frame, blend it with the overlay
             if current_frame is not None and overlay is not None:
-                # Blend overlay with frame
+                # Blend overlay with frame into the preallocated output
                 alpha = 0.6
-                combined_frame = cv2.addWeighted(current_frame, alpha, overlay, 1-alpha, 0)
+                cv2.addWeighted(current_frame, alpha, overlay, 1-alpha, 0, dst=combined_frame)
                 
                 # Display the calibration frame
                 cv2.imshow("Calibration", combined_frame)
@@ -116,14 +180,15 @@ def run_enhanced_calibration(calibration_module):
             
             # Process key events
             if wait_for_key:
-                cv2.waitKey(0)  # Wait indefinitely for a key press
+                # Poll for the key press instead of blocking in waitKey(0) so gaze samples keep flowing
+                while cv2.waitKey(10) & 0xFF == 255:
+                    receive_gaze_data(block=False)
             else:
+                # waitKey(33) alone paces the loop at ~30fps
                 key = cv2.waitKey(33) & 0xFF
                 if key == ord('q'):
                     print("Calibration aborted by user")
                     break
-            
-            time.sleep(0.03)  # ~30fps
                 
         # Calibration complete or aborted
         calibration_success = calibration_module.is_calibrated()
@@ -137,36 +202,55 @@ def run_enhanced_calibration(calibration_module):
         return False
 
 def get_scene_objects(zmq_connection):
+    response = zmq_connection.find_indexed_objects("/target", max_count=20)
+    if response.get('returnCode') != 0:
+        print(f"Failed to discover scene objects: {response.get('error')}")
+        return []
     objects = []
-    object_id = 0
-    potential_targets = [f"/target[{i}]" for i in range(20)]
-    for target_name in potential_targets:
-        try:
-            response = zmq_connection.get_object_handle(target_name)
-            if response.get('returnCode') == 0:
-                target_handle = response.get('handle')
-                position_response = zmq_connection.get_object_position(target_handle, -1)
-                if position_response.get('returnCode') == 0:
-                    position = position_response.get('position')
-                    objects.append({
-                        "id": object_id,
-                        "handle": target_handle,
-                        "name": target_name,
-                        "position": position
-                    })
-                    object_id += 1
-                    print(f"Found target: {target_name} at position {position}")
-            else:
-                if "[" in target_name and "target[0]" not in target_name:
-                    break
-        except:
-            if "[" in target_name and "target[0]" not in target_name:
-                break
-            continue
+    for object_id, found in enumerate(response.get('objects', [])):
+        objects.append({
+            "id": object_id,
+            "handle": found["handle"],
+            "name": found["name"],
+            "position": found["position"]
+        })
+        print(f"Found target: {found['name']} at position {found['position']}")
     return objects
 
+class SceneObjectCache:
+    """Wraps get_scene_objects: handles are resolved once, then only positions are refreshed"""
+    def __init__(self, zmq_connection):
+        self.zmq = zmq_connection
+        self._handle_cache = []  # [(object_id, handle, name)]
+
+    def invalidate(self):
+        """Drop the cached handles so the next get_objects() rediscovers the targets"""
+        self._handle_cache = []
+        self.zmq.invalidate_handles()
+
+    def get_objects(self):
+        """Discover the targets on the first call (or after invalidate()), later calls only refresh positions"""
+        if not self._handle_cache:
+            objects = get_scene_objects(self.zmq)
+            self._handle_cache = [(obj["id"], obj["handle"], obj["name"]) for obj in objects]
+            return objects
+
+        # One batched request for every cached handle
+        response = self.zmq.get_object_positions([handle for _, handle, _ in self._handle_cache], -1)
+        positions = response.get('positions', [])
+        if response.get('returnCode') != 0 or len(positions) != len(self._handle_cache):
+            # Handles went stale (e.g. scene reloaded) - rediscover now instead of dropping the targets until the next refresh
+            print(f"Failed to refresh object positions: {response.get('error')}")
+            self.invalidate()
+            return self.get_objects()
+
+        return [
+            {"id": object_id, "handle": handle, "name": name, "position": position}
+            for (object_id, handle, name), position in zip(self._handle_cache, positions)
+        ]
+
 def main():
-    global running
+    global running, gaze_queue, gaze_shm, gaze_frame, gaze_frame_lock
 
     print("Starting Eye Gaze Control System...")
     try:
@@ -191,28 +275,29 @@ def main():
         print("Initializing calibration module...")
         calibration_module = CalibrationModule(zmq_connection, gaze_tracker, agent, duration_per_target=3.0)
 
+        scene_objects = SceneObjectCache(zmq_connection)
+        scene_listener = SceneChangeListener(ip="127.0.0.1", port=23010)
+
     except Exception as e:
         print(f"Initialization error: {e}")
         zmq_connection.disconnect()
         sys.exit("Initialization failed")
 
-    # Start gaze tracking thread
-    gaze_thread_handle = threading.Thread(target=gaze_thread, daemon=True)
-    gaze_thread_handle.start()
+    # Start the gaze capture process; pupil detection runs there, off this interpreter's GIL
+    gaze_shm = shared_memory.SharedMemory(create=True, size=int(np.prod(FRAME_SHAPE)))
+    gaze_frame = np.ndarray(FRAME_SHAPE, dtype=np.uint8, buffer=gaze_shm.buf)
+    gaze_frame_lock = mp.Lock()
+    gaze_queue = mp.Queue(maxsize=1)
+    gaze_stop = mp.Event()
+    gaze_process_handle = mp.Process(target=gaze_process,
+                                     args=(gaze_shm.name, gaze_frame_lock, gaze_queue, gaze_stop),
+                                     daemon=True)
+    gaze_process_handle.start()
     
     # Give the gaze tracker time to initialize
     print("Initializing webcam and gaze tracker...")
     time.sleep(2.0)
     
-    # Create main window and set it to always be on top
-    cv2.namedWindow("Gaze Frame", cv2.WINDOW_NORMAL)
-    set_window_always_on_top("Gaze Frame")
-    
-    # Create additional window for keyboard controls and make it always on top
-    cv2.namedWindow("Keyboard Controls", cv2.WINDOW_NORMAL)
-    cv2.moveWindow("Keyboard Controls", 0, 0)  # Position at top-left
-    cv2.resizeWindow("Keyboard Controls", 300, 180)
-    
     # Create a small help image for keyboard controls
     help_img = np.zeros((180, 300, 3), dtype=np.uint8)
     cv2.putText(help_img, "Keyboard Controls:", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
@@ -221,13 +306,15 @@ def main():
     cv2.putText(help_img, "C - Recalibrate", (10, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
     cv2.putText(help_img, "R - Reset calibration", (10, 150), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
     
-    # Set the help window to be always on top
-    set_window_always_on_top("Keyboard Controls")
+    # Start the display thread; it owns the gaze and help windows
+    render_thread_handle = threading.Thread(target=render_thread, args=(help_img,), daemon=True)
+    render_thread_handle.start()
 
     # Offer calibration to the user
     if input("Run enhanced gaze calibration? (y/n): ").strip().lower().startswith("y"):
         # Run the enhanced calibration sequence
-        calibration_success = run_enhanced_calibration(calibration_module)
+        with gui_lock:
+            calibration_success = run_enhanced_calibration(calibration_module)
         if calibration_success:
             print("Enhanced calibration completed successfully!")
             print("The system is now calibrated to YOUR gaze patterns.")
@@ -241,25 +328,36 @@ def main():
     last_object_check = 0
     object_check_interval = 0.5
     objects = []
+    positions_xy = np.empty((0, 2), dtype=np.float32)
 
     while running:
-        # Always display the help window
-        cv2.imshow("Keyboard Controls", help_img)
-        
-        with frame_lock:
-            current_frame = frame
-            current_gaze_data = gaze_data
+        if not gaze_process_handle.is_alive():
+            print("Gaze capture process stopped")
+            break
 
+        # Blocks until the gaze process publishes a new sample (or the timeout passes)
+        current_gaze_data, current_frame = receive_gaze_data()
+
+        # Hand the frame to the render thread; never wait on the GUI here
         if current_frame is not None:
-            cv2.imshow("Gaze Frame", current_frame)
-        key = cv2.waitKey(1) & 0xFF
+            put_latest(render_queue, current_frame)
+        try:
+            key = key_queue.get_nowait()
+        except queue.Empty:
+            key = 255
+        # Poll the keyboard once per iteration; both branches below use these values
+        x_axis, y_axis, keyboard_running = keyboard.update()
+        if not keyboard_running:
+            running = False
+            break
         if key == ord('q'):
             running = False
             break
         elif key == ord('c'):
             # Recalibration option
             print("Starting recalibration...")
-            run_enhanced_calibration(calibration_module)
+            with gui_lock:
+                run_enhanced_calibration(calibration_module)
         elif key == ord('r'):
             # Reset calibration
             gaze_filter = get_gaze_filter()
@@ -272,8 +370,14 @@ def main():
                 print("Could not access gaze filter to reset calibration")
 
         current_time = time.time()
-        if current_time - last_object_check > object_check_interval:
-            objects = get_scene_objects(zmq_connection)
+        # Rediscover targets on a scene change event; otherwise refresh their positions with one batched request
+        if scene_listener.changed.is_set() or current_time - last_object_check > object_check_interval:
+            if scene_listener.changed.is_set():
+                # Targets may have been added or removed, so rebuild the list instead of refreshing positions
+                scene_listener.changed.clear()
+                scene_objects.invalidate()
+            objects = scene_objects.get_objects()
+            positions_xy = np.asarray([[obj["position"][0], obj["position"][1]] for obj in objects], dtype=np.float32).reshape(-1, 2)
             last_object_check = current_time
             if not objects:
                 print("No objects found in scene")
@@ -281,9 +385,6 @@ def main():
                 print(f"Found {len(objects)} objects in scene")
 
         if not objects:
-            x_axis, y_axis, keyboard_running = keyboard.update()
-            if not keyboard_running:
-                running = False
             continue
 
         if current_gaze_data and current_gaze_data.get("pupils_located", False):
@@ -297,32 +398,23 @@ def main():
             if h_ratio is not None and v_ratio is not None:
                 wx = -1.0 + 2.0 * h_ratio
                 wy = -1.0 + 2.0 * v_ratio
-                min_distance = float('inf')
-                for obj in objects:
-                    ox, oy, _ = obj["position"]
-                    distance = np.sqrt((wx - ox)**2 + (wy - oy)**2)
-                    if distance < min_distance:
-                        min_distance = distance
-                        gazed_object = obj
+                # Squared distances to every object at once; sqrt is unnecessary for the comparison
+                d2 = (positions_xy[:, 0] - wx)**2 + (positions_xy[:, 1] - wy)**2
+                idx = int(np.argmin(d2))
                 
                 # If calibrated, we can use a tighter threshold since accuracy should be better
                 distance_threshold = 0.3 if is_calibrated else 0.5
-                if min_distance >= distance_threshold:
-                    gazed_object = None
+                if d2[idx] < distance_threshold**2:
+                    gazed_object = objects[idx]
                     
             if gazed_object:
                 print(f"Looking at: {gazed_object['name']}")
                 gaze_tracker.update(gazed_object["id"])
                 agent.update_gaze_history(gazed_object["id"], current_time)
 
-        x_axis, y_axis, keyboard_running = keyboard.update()
-        if not keyboard_running:
-            running = False
-            break
-
         if (abs(x_axis) > 0.2 or abs(y_axis) > 0.2) and (current_time - last_action_time > action_cooldown):
             joystick_direction = agent.get_joystick_direction(x_axis, y_axis)
-            gaze_durations = {obj["id"]: gaze_tracker.get_duration(obj["id"]) for obj in objects}
+            gaze_durations = gaze_tracker.get_durations(obj["id"] for obj in objects)
             selected_obj_id = agent.get_action(joystick_direction, current_time, objects, gaze_durations)
 
             if selected_obj_id is not None and 0 <= selected_obj_id < len(objects):
@@ -330,7 +422,7 @@ def main():
                 print(f"Selected object: {target['name']}")
                 success = robot.move_to_object(target["handle"])
                 if success:
-                    recent_gazes = [g["object_id"] for g in agent.gaze_history[-5:]]
+                    recent_gazes = agent.get_recent_gazes(5)
                     reward = 1.0 if selected_obj_id in recent_gazes else -0.2
                     agent.update_q_table(selected_obj_id, joystick_direction, reward)
                     print(f"Updated Q-values with reward: {reward}")
@@ -338,12 +430,20 @@ def main():
 
     print("Cleaning up resources...")
     keyboard.close()
+    scene_listener.close()
     running = False
     
-    # Wait for gaze thread to finish
-    if gaze_thread_handle.is_alive():
-        gaze_thread_handle.join(timeout=1.0)
-        
+    # Stop the gaze process and wait for the render thread to finish
+    gaze_stop.set()
+    gaze_process_handle.join(timeout=1.0)
+    if gaze_process_handle.is_alive():
+        gaze_process_handle.terminate()
+    if render_thread_handle.is_alive():
+        render_thread_handle.join(timeout=1.0)
+
+    gaze_frame = None
+    gaze_shm.close()
+    gaze_shm.unlink()
     close_gaze_tracker()
     zmq_connection.disconnect()
     cv2.destroyAllWindows()
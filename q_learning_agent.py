@@ -1,104 +1,213 @@
+import math
+import logging
 import numpy as np
 import time
+from numba import njit
+
+# Per-call agent traces are logged at DEBUG so they cost only a level check at the default INFO level
+logger = logging.getLogger("GazeJoystickAgent")
+logger.setLevel(logging.INFO)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+
+@njit(nogil=True, cache=True)
+def _probability(k, joystick_direction, time_diff):
+    # 1 / (1 + exp(k * exp(t * d))) written as expit(-k * exp(t * d)); clipping the inner
+    # exponent and picking the branch by sign keeps both exponentials finite
+    x = -k * math.exp(min(time_diff * joystick_direction, 30.0))
+    if x >= 0:
+        return 1.0 / (1.0 + math.exp(-x))
+    e = math.exp(x)
+    return e / (1.0 + e)
+
+
+@njit(nogil=True, cache=True, fastmath=True)
+def _compute_action(hist_ids, hist_times, n_objects, current_time, time_window, prob_row,
+                    q_col, durations, min_gaze_duration,
+                    exploration_rate, explore_u, rand_u, out):
+    """
+    Score objects 0..n_objects-1 from the gaze ring buffer into out[:n_objects] and pick one (-1 = no action)
+    Returns (valid count, action, explored)
+    """
+    # Most recent gaze of each object inside the time window
+    seen = np.zeros(n_objects, dtype=np.bool_)
+    time_diffs = np.zeros(n_objects)
+    for i in range(hist_ids.size):
+        obj_id = hist_ids[i]
+        if obj_id < 0 or obj_id >= n_objects:
+            continue
+        time_diff = current_time - hist_times[i]
+        if time_diff <= time_window and (not seen[obj_id] or time_diff < time_diffs[obj_id]):
+            seen[obj_id] = True
+            time_diffs[obj_id] = time_diff
+
+    probabilities = out[:n_objects]
+    probabilities[:] = 0.0
+    lut_last = prob_row.size - 1
+    lut_scale = lut_last / time_window
+    n_valid = 0
+    for obj_id in range(n_objects):
+        if not seen[obj_id] or durations[obj_id] < min_gaze_duration:
+            continue
+        n_valid += 1
+        # Nearest entry of the probability table sampled over [0, time_window]
+        p = prob_row[max(0, min(int(time_diffs[obj_id] * lut_scale + 0.5), lut_last))]
+        p *= min(durations[obj_id] / 2.0, 1.0)
+        probabilities[obj_id] = 0.7 * p + 0.3 * q_col[obj_id]
+    if n_valid == 0:
+        return n_valid, -1, False
+
+    if explore_u < exploration_rate:
+        # Uniform pick among the objects with a positive probability
+        n_positive = 0
+        for obj_id in range(n_objects):
+            if probabilities[obj_id] > 0:
+                n_positive += 1
+        if n_positive == 0:
+            return n_valid, -1, True
+        pick = min(int(rand_u * n_positive), n_positive - 1)
+        for obj_id in range(n_objects):
+            if probabilities[obj_id] > 0:
+                if pick == 0:
+                    return n_valid, obj_id, True
+                pick -= 1
+
+    action = 0
+    for obj_id in range(1, n_objects):
+        if probabilities[obj_id] > probabilities[action]:
+            action = obj_id
+    if probabilities[action] > 0:
+        return n_valid, action, False
+    return n_valid, -1, False
+
+
+# Time samples per joystick direction in the probability lookup table
+PROB_LUT_SIZE = 256
+
 
 class GazeJoystickAgent:
+    # Joystick direction indexed by [sign(y) + 1, sign(x) + 1] after the 0.2 deadband; -1 = centered
+    _DIR_LUT = np.array([[5, 0, 4],
+                         [3, -1, 1],
+                         [7, 2, 6]], dtype=np.int8)
+
     def __init__(self, max_objects=10, learning_rate=0.1, discount_factor=0.9, exploration_rate=0.1):
         self.max_objects = max_objects
         self.learning_rate = learning_rate
         self.discount_factor = discount_factor
         self.exploration_rate = exploration_rate
 
-        self.q_table = np.zeros((max_objects, 8))
-        self.gaze_history = []
+        # Column-major so that the Q-values of one joystick direction are contiguous
+        self.q_table = np.zeros((max_objects, 8), dtype=np.float32, order='F')
         self.max_history_size = 50
+        # Gaze history ring buffer: object id (-1 = empty slot) and timestamp per entry
+        self._hist_ids = np.full(self.max_history_size, -1, dtype=np.int32)
+        self._hist_times = np.zeros(self.max_history_size, dtype=np.float64)
+        self._hist_head = 0
+        self._last_gaze_ts = -math.inf
         self.time_window = 3.0
         self.k = 1.0
-        self.last_probabilities = []
+        # Scores of the last get_action call; a view into a buffer the kernel writes in place
+        self._probabilities = np.zeros(max_objects, dtype=np.float32)
+        self.last_probabilities = self._probabilities[:0]
+        self._durations = np.zeros(max_objects, dtype=np.float32)
+        self._prob_lut = None
+        self._prob_lut_params = None
         self.min_gaze_duration = 0.2  # Reduced from 0.5 to allow faster testing
 
     def update_gaze_history(self, object_id, timestamp):
-        self.gaze_history.append({"object_id": object_id, "timestamp": timestamp})
-        if len(self.gaze_history) > self.max_history_size:
-            self.gaze_history.pop(0)
+        self._hist_ids[self._hist_head] = object_id
+        self._hist_times[self._hist_head] = timestamp
+        self._hist_head = (self._hist_head + 1) % self.max_history_size
+        self._last_gaze_ts = max(self._last_gaze_ts, timestamp)
+
+    def update_gaze_history_batch(self, object_id, timestamps):
+        """Record several gazes at one object, in timestamp order, with one ring-buffer write"""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        count = timestamps.size
+        if count == 0:
+            return
+        # Only the newest max_history_size entries survive, at the slots a one-by-one write would leave them
+        kept = timestamps[-self.max_history_size:]
+        slots = (self._hist_head + count - kept.size + np.arange(kept.size)) % self.max_history_size
+        self._hist_ids[slots] = object_id
+        self._hist_times[slots] = kept
+        self._hist_head = (self._hist_head + count) % self.max_history_size
+        self._last_gaze_ts = max(self._last_gaze_ts, float(timestamps.max()))
+
+    def get_recent_gazes(self, count=5):
+        """Return the object ids of the last `count` gazes, oldest first"""
+        count = min(count, self.max_history_size)
+        slots = (self._hist_head - count + np.arange(count)) % self.max_history_size
+        recent = self._hist_ids[slots]
+        return recent[recent >= 0].tolist()
 
     def get_joystick_direction(self, x_axis, y_axis):
-        if abs(x_axis) < 0.2 and abs(y_axis) < 0.2:
-            return None
-        if abs(x_axis) < 0.2:
-            return 0 if y_axis < 0 else 2
-        elif abs(y_axis) < 0.2:
-            return 1 if x_axis > 0 else 3
-        else:
-            if x_axis > 0 and y_axis < 0:
-                return 4
-            elif x_axis < 0 and y_axis < 0:
-                return 5
-            elif x_axis > 0 and y_axis > 0:
-                return 6
-            else:
-                return 7
+        sx = 0 if abs(x_axis) < 0.2 else (1 if x_axis > 0 else -1)
+        sy = 0 if abs(y_axis) < 0.2 else (1 if y_axis > 0 else -1)
+        direction = self._DIR_LUT[sy + 1, sx + 1]
+        return None if direction < 0 else int(direction)
 
     def probability_model(self, obj_id, joystick_direction, time_diff):
-        exponent = self.k * (np.exp(time_diff * joystick_direction))
-        probability = 1.0 / (1.0 + np.exp(exponent))
-        return probability
+        return _probability(self.k, joystick_direction, time_diff)
+
+    def _get_prob_lut(self):
+        """Probability model tabulated per joystick direction over [0, time_window], rebuilt if k or the window change"""
+        params = (self.k, self.time_window)
+        if params != self._prob_lut_params:
+            time_diffs = np.linspace(0.0, self.time_window, PROB_LUT_SIZE)
+            self._prob_lut = np.array([[_probability(self.k, direction, t) for t in time_diffs]
+                                       for direction in range(8)], dtype=np.float32)
+            self._prob_lut_params = params
+        return self._prob_lut
 
     def get_action(self, joystick_direction, current_time, objects, gaze_durations):
-        print(f"[Agent] get_action called with joystick_direction={joystick_direction}, num_objects={len(objects)}")
-        print("Durations:", {k: round(v, 2) for k, v in gaze_durations.items()})  # Log gaze durations
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("get_action called with joystick_direction=%s, num_objects=%d", joystick_direction, len(objects))
+            logger.debug("Durations: %s", {k: round(v, 2) for k, v in gaze_durations.items()})
 
         if joystick_direction is None or not objects:
             return None
 
-        recent_objects = {}
-        for gaze_point in reversed(self.gaze_history):
-            time_diff = current_time - gaze_point["timestamp"]
-            if time_diff <= self.time_window:
-                obj_id = gaze_point["object_id"]
-                if obj_id not in recent_objects or time_diff < recent_objects[obj_id]:
-                    recent_objects[obj_id] = time_diff
+        # Nothing in the history can be inside the time window
+        if current_time - self._last_gaze_ts > self.time_window:
+            self.last_probabilities = self._probabilities[:0]
+            logger.debug("No recent gazes")
+            return None
 
-        valid_objects = {obj_id: time_diff for obj_id, time_diff in recent_objects.items()
-                         if gaze_durations.get(obj_id, 0) >= self.min_gaze_duration}
+        n_objects = min(len(objects), self.max_objects)
+        durations = self._durations[:n_objects]
+        durations[:] = 0.0
+        for obj_id, duration in gaze_durations.items():
+            if 0 <= obj_id < n_objects:
+                durations[obj_id] = duration
 
-        if not valid_objects:
-            print("[Agent] No objects have been gazed at long enough")
-            return None
+        n_valid, action, explored = _compute_action(
+            self._hist_ids, self._hist_times, n_objects, current_time, self.time_window,
+            self._get_prob_lut()[joystick_direction], self.q_table[:, joystick_direction], durations, self.min_gaze_duration,
+            self.exploration_rate, np.random.random(), np.random.random(), self._probabilities)
 
-        probabilities = []
-        for obj_id in range(min(len(objects), self.max_objects)):
-            q_value = self.q_table[obj_id, joystick_direction]
-            if obj_id in valid_objects:
-                time_diff = valid_objects[obj_id]
-                duration = gaze_durations.get(obj_id, 0)
-                p = self.probability_model(obj_id, joystick_direction, time_diff)
-                p *= min(duration / 2.0, 1.0)
-                p = 0.7 * p + 0.3 * q_value
-            else:
-                p = 0
-            probabilities.append(p)
-
-        self.last_probabilities = probabilities
-        print("Probabilities:", [f"{p:.2f}" for p in probabilities])  # Log probabilities
-
-        if max(probabilities) == 0:
+        if n_valid == 0:
+            self.last_probabilities = self._probabilities[:0]
+            logger.debug("No objects have been gazed at long enough")
             return None
 
-        if np.random.random() < self.exploration_rate:
-            valid_indices = [i for i, p in enumerate(probabilities) if p > 0]
-            if valid_indices:
-                action = np.random.choice(valid_indices)
-                print(f"[Agent] Exploration: randomly selected object {action}")
-                return action
-            else:
-                return None
+        self.last_probabilities = self._probabilities[:n_objects]
+        if debug:
+            logger.debug("Probabilities: %s", [f"{p:.2f}" for p in self.last_probabilities])
+
+        if action < 0:
+            return None
+        if explored:
+            logger.debug("Exploration: randomly selected object %d", action)
         else:
-            action = np.argmax(probabilities)
-            if probabilities[action] > 0:
-                print(f"[Agent] Exploitation: selected object {action} with highest probability")
-                return action
-            else:
-                return None
+            logger.debug("Exploitation: selected object %d with highest probability", action)
+        return action
 
     def update_q_table(self, obj_id, joystick_direction, reward):
         if obj_id < self.q_table.shape[0]:
@@ -1,6 +1,36 @@
 import time
 import math
 import numpy as np
+from numba import njit
+
+# Pre-defined level curve from CoppeliaSim script: sorted radii and one pose row (radians) per radius
+_LEVEL_CURVE_RADII = np.array([0.16, 0.19, 0.225, 0.25, 0.275])
+_LEVEL_CURVE_POSES = np.deg2rad(np.array([
+    [-20.0, 0.0, -135.0, 48.0, 0],
+    [-20.0, -10.0, -118.0, 44.0, 0],
+    [-20.0, -35.0, -83.0, 31.0, 0],
+    [-20.0, -47.5, -57.0, 21.0, 0],
+    [-20.0, -75.0, 0.0, -7.5, 0]
+], dtype=np.float32))
+_LEVEL_CURVE_RADII.flags.writeable = False
+_LEVEL_CURVE_POSES.flags.writeable = False
+
+
+@njit(nogil=True, cache=True, fastmath=True)
+def _ik_core(x, y, radii, poses, out):
+    """Write the level-curve pose nearest to radius hypot(x, y) into out with the base angle set; returns the row index"""
+    dist = math.hypot(x, y)
+    # Nearest radius, the smaller one on a tie
+    idx = np.searchsorted(radii, dist)
+    if idx == radii.size:
+        idx -= 1
+    elif idx > 0 and dist - radii[idx - 1] <= radii[idx] - dist:
+        idx -= 1
+    out[:] = poses[idx]
+    # Base joint angle wrapped to [-pi, pi)
+    theta = math.atan2(y, x) + math.pi / 2 + 0.27
+    out[0] = (theta + math.pi) % (2 * math.pi) - math.pi
+    return idx
 
 class RobotController:
     def __init__(self, zmq_connection):
@@ -17,23 +47,16 @@ class RobotController:
         # Initialize robot
         self.initialize_robot()
         
-        # Pre-defined level curve from CoppeliaSim script
-        self.level_curve = self.get_level_curve()
-
-    def get_level_curve(self):
-        """Get the pre-defined level curve for different radii"""
-        radii = [0.16, 0.19, 0.225, 0.25, 0.275]
-        poses = np.deg2rad([
-            [-20.0, 0.0, -135.0, 48.0, 0],
-            [-20.0, -10.0, -118.0, 44.0, 0],
-            [-20.0, -35.0, -83.0, 31.0, 0],
-            [-20.0, -47.5, -57.0, 21.0, 0],
-            [-20.0, -75.0, 0.0, -7.5, 0]
-        ])
-        return dict(zip(radii, poses.tolist()))
+        # Reused for every calculate_joint_positions result
+        self._joint_targets = np.empty(_LEVEL_CURVE_POSES.shape[1], dtype=np.float32)
 
     def angle_mod(self, x, zero_2_2pi=False, degree=False):
         """Modulates angles to standard ranges: [-π,π) or [0,2π)"""
+        if isinstance(x, (int, float)):
+            # Scalar fast path, no array round-trip
+            period = 360.0 if degree else 2 * math.pi
+            return x % period if zero_2_2pi else (x + period / 2) % period - period / 2
+
         is_float = isinstance(x, float)
         x = np.asarray(x).flatten()
         
@@ -55,21 +78,28 @@ class RobotController:
                 joint_name = f'/my_cobot/joint{i+1}_to_joint{i}'
                 joint_names.append(joint_name)
             
+            # Look up the joints and the base with one request
             self.joint_handles = []
-            for joint_name in joint_names:
-                try:
-                    handle = self.sim.getObject(joint_name)
+            self.base_handle = None
+            result = self.zmq.get_object_handles(joint_names + ['/my_cobot'])
+            if result["returnCode"] != 0:
+                print(f"Failed to get robot handles: {result['error']}")
+                handles = [-1] * (len(joint_names) + 1)
+            else:
+                handles = result["handles"]
+
+            for joint_name, handle in zip(joint_names, handles):
+                if handle >= 0:
                     self.joint_handles.append(handle)
                     print(f"Got handle for {joint_name}")
-                except Exception as e:
-                    print(f"Failed to get handle for {joint_name}: {e}")
+                else:
+                    print(f"Failed to get handle for {joint_name}")
             
             # Get base handle
-            try:
-                self.base_handle = self.sim.getObject('/my_cobot')
+            if handles[-1] >= 0:
+                self.base_handle = handles[-1]
                 print("Got base handle")
-            except:
-                self.base_handle = None
+            else:
                 print("Could not get base handle")
 
             if self.joint_handles:
@@ -81,32 +111,18 @@ class RobotController:
         except Exception as e:
             print(f"Error initializing robot: {e}")
 
-    def calculate_joint_positions(self, target_position, target_handle=None):
-        """Calculate joint positions using the level curve approach"""
-        # Get target position relative to base if target_handle is provided
-        if self.base_handle is not None and target_handle is not None:
-            try:
-                rel_pos = self.sim.getObjectPosition(target_handle, self.base_handle)
-            except:
-                rel_pos = target_position
-        else:
-            rel_pos = target_position
-        
-        # Calculate distance from base
-        dist = math.hypot(rel_pos[0], rel_pos[1])
+    def calculate_joint_positions(self, rel_pos):
+        """
+        Calculate joint positions using the level curve approach for a base-relative target position
+        The returned float32 array is reused by the next call; copy it if it has to be kept
+        """
+        x, y = float(rel_pos[0]), float(rel_pos[1])
         
-        # Find the closest radius in the level curve
-        best_radius, target_poses = min(self.level_curve.items(), 
-                                       key=lambda x: abs(dist - x[0]))
+        # Closest level-curve pose with the base joint turned towards the target (valid until the next call)
+        target_joint_positions = self._joint_targets
+        idx = _ik_core(x, y, _LEVEL_CURVE_RADII, _LEVEL_CURVE_POSES, target_joint_positions)
         
-        print(f"Distance: {dist}, Best radius: {best_radius}")
-        
-        # Calculate the angle for the base joint
-        theta = self.angle_mod(math.atan2(rel_pos[1], rel_pos[0]) + math.pi/2 + 0.27)
-        
-        # Create the target joint positions
-        target_joint_positions = target_poses.copy()
-        target_joint_positions[0] = theta
+        print(f"Distance: {math.hypot(x, y)}, Best radius: {_LEVEL_CURVE_RADII[idx]}")
         
         return target_joint_positions
 
@@ -118,31 +134,30 @@ class RobotController:
         try:
             # Get current joint positions
             current_positions = self.get_joint_positions()
-            if None in current_positions:
+            if current_positions.size == 0 or np.isnan(current_positions).any():
                 print("Failed to get current joint positions")
                 return False
             
             # Calculate the trajectory
             steps = int(duration * 50)  # 50 Hz update rate
             time_step = duration / steps
+            start_time = time.perf_counter()
             
-            for i in range(steps + 1):
-                t = i / steps  # Progress from 0 to 1
-                
-                # Smooth interpolation using cosine
-                smooth_t = (1 - math.cos(t * math.pi)) / 2
-                
-                # Interpolate joint positions
-                interpolated_positions = []
-                for j in range(len(current_positions)):
-                    pos = current_positions[j] + (target_config[j] - current_positions[j]) * smooth_t
-                    interpolated_positions.append(pos)
-                
-                # Set joint positions
-                for handle, pos in zip(self.joint_handles, interpolated_positions):
-                    self.sim.setJointPosition(handle, pos)
+            # Precompute the whole trajectory with cosine smoothing: one row of joint positions per tick
+            start = np.asarray(current_positions, dtype=float)
+            target = np.asarray(target_config, dtype=float)[:len(start)]
+            smooth_t = (1 - np.cos(np.linspace(0.0, 1.0, steps + 1) * np.pi)) / 2
+            trajectory = start + (target - start) * smooth_t[:, None]
+            
+            for i, interpolated_positions in enumerate(trajectory.tolist()):
+                # Set all joint positions with one request
+                if self.zmq.set_joint_positions(self.joint_handles, interpolated_positions) != 0:
+                    return False
                 
-                time.sleep(time_step)
+                # Sleep only for what is left of this tick, so RPC time doesn't stretch the move
+                remaining = start_time + (i + 1) * time_step - time.perf_counter()
+                if remaining > 0:
+                    time.sleep(remaining)
             
             return True
             
@@ -157,19 +172,16 @@ class RobotController:
             return False
 
         try:
-            # Get the target object's position
-            target_position = self.sim.getObjectPosition(object_handle, -1)
-            print(f"Target object position: {target_position}")
-            
-            # Get position relative to base
+            # Get the target object's position relative to the base (world frame without a base)
             if self.base_handle is not None:
                 rel_position = self.sim.getObjectPosition(object_handle, self.base_handle)
                 print(f"Target position relative to base: {rel_position}")
             else:
-                rel_position = target_position
+                rel_position = self.sim.getObjectPosition(object_handle, -1)
+                print(f"Target object position: {rel_position}")
             
-            # Calculate joint positions using level curve with the object handle
-            joint_positions = self.calculate_joint_positions(rel_position, object_handle)
+            # Calculate joint positions using level curve
+            joint_positions = self.calculate_joint_positions(rel_position)
             print(f"Calculated joint positions: {joint_positions}")
             
             # Move smoothly to the target
@@ -188,16 +200,13 @@ class RobotController:
             return False
 
     def get_joint_positions(self):
-        """Get current joint positions"""
+        """Get current joint positions as an array; joints that could not be read are NaN"""
         if not self.initialized:
-            return []
+            return np.empty(0)
 
-        joint_positions = []
-        for handle in self.joint_handles:
-            try:
-                pos = self.sim.getJointPosition(handle)
-                joint_positions.append(pos)
-            except:
-                joint_positions.append(None)
+        # One batched request for all joints
+        ret, joint_positions = self.zmq.get_joint_positions(self.joint_handles)
+        if ret != 0 or len(joint_positions) != len(self.joint_handles):
+            return np.full(len(self.joint_handles), np.nan)
 
-        return joint_positions
\ No newline at end of file
+        return np.asarray(joint_positions, dtype=float)
\ No newline at end of file
@@ -1,6 +1,14 @@
+import os
+import sys
 import time
 import random
 import numpy as np
+import matplotlib
+
+# Batch runs (no terminal or no display) render off-screen and save the plot instead of opening a window
+INTERACTIVE = sys.stdin.isatty() and (os.name == "nt" or bool(os.environ.get("DISPLAY")))
+if not INTERACTIVE:
+    matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 
 from q_learning_agent import GazeJoystickAgent
@@ -18,24 +26,24 @@ duration_tracker = GazeDurationTracker()
 for episode in range(20):
     print(f"\n=== Episode {episode + 1} ===")
 
-   
+    # Gaze samples every 0.05s, recorded up front and then waited out in one sleep
+    start = time.time()
+
 # object 2
-    for _ in range(15):
-        duration_tracker.update(2)
-        agent.update_gaze_history(2, time.time())
-        time.sleep(0.05)
+    duration_tracker.update_many(2, 15, 0.05, start=start)
+    agent.update_gaze_history_batch(2, start + np.arange(15) * 0.05)
 
     # object 3
-    for _ in range(4):
-        duration_tracker.update(3)
-        agent.update_gaze_history(3, time.time())
-        time.sleep(0.05)
+    duration_tracker.update_many(3, 4, 0.05, start=start + 0.75)
+    agent.update_gaze_history_batch(3, start + 0.75 + np.arange(4) * 0.05)
+
+    time.sleep(0.95)
 
     # joystick press right... i think
     x_axis, y_axis = 0.0, 1.0
     joystick_dir = agent.get_joystick_direction(x_axis, y_axis)
 
-    durations = {obj['id']: duration_tracker.get_duration(obj['id']) for obj in objects}
+    durations = duration_tracker.get_durations(obj['id'] for obj in objects)
     chosen_id = agent.get_action(joystick_dir, time.time(), objects, durations)
 
     if chosen_id is not None:
@@ -44,7 +52,7 @@ for episode in range(20):
         print(f"Q-value before update: {old_q:.3f}")
 
       
-        recent_gazes = [g["object_id"] for g in agent.gaze_history[-5:]]
+        recent_gazes = agent.get_recent_gazes(5)
         reward = 1.0 if chosen_id in recent_gazes else -0.2
 
         agent.update_q_table(chosen_id, joystick_dir, reward)
@@ -66,4 +74,7 @@ if PLOT_Q_TABLE:
     plt.yticks(np.arange(agent.q_table.shape[0]))
     plt.grid(False)
     plt.tight_layout()
-    plt.show()
+    if INTERACTIVE:
+        plt.show()
+    else:
+        plt.savefig('q_table.png', dpi=100)
@@ -1,20 +1,36 @@
 # test_robot_movement.py
 import time
-from coppeliasim_zmqremoteapi_client import RemoteAPIClient
+from zmq_connection import ZMQConnection
+
+def advance(sim, seconds, stepping):
+    """Let `seconds` of simulation time pass: step the simulation if stepping, otherwise wait in real time"""
+    if not stepping:
+        time.sleep(seconds)
+        return
+    for _ in range(max(1, round(seconds / sim.getSimulationTimeStep()))):
+        sim.step()
 
 def test_robot_movement():
     print("Testing Robot Movement in CoppeliaSim...")
     
+    sim = None
+    stepping = False
     try:
         # Connect to CoppeliaSim
-        client = RemoteAPIClient('127.0.0.1', 23000)
-        sim = client.getObject('sim')
+        zmq_connection = ZMQConnection(ip="127.0.0.1", port=23000)
+        sim = zmq_connection.sim
         print("Connected to CoppeliaSim")
         
         # Check simulation state
         state = sim.getSimulationState()
         print(f"Simulation state: {state} (0=stopped, 1=running, 2=paused)")
         
+        # Advance a running simulation step by step instead of waiting on the wall clock;
+        # a paused simulation would never perform the step, so it keeps the real-time wait
+        if state == sim.simulation_advancing_running:
+            sim.setStepping(True)
+            stepping = True
+        
         # Get handles
         print("\n=== Getting Handles ===")
         joint_names = [
@@ -25,30 +41,32 @@ def test_robot_movement():
             '/my_cobot/joint6_to_joint5'
         ]
         
+        # All handles and positions below are fetched with one request each
         joint_handles = []
-        for name in joint_names:
-            try:
-                handle = sim.getObject(name)
-                joint_handles.append(handle)
-                print(f"Got handle for {name}: {handle}")
-            except Exception as e:
-                print(f"Error getting {name}: {e}")
+        result = zmq_connection.get_object_handles(joint_names)
+        if result["returnCode"] != 0:
+            print(f"Error getting joint handles: {result['error']}")
+        else:
+            for name, handle in zip(joint_names, result["handles"]):
+                if handle >= 0:
+                    joint_handles.append(handle)
+                    print(f"Got handle for {name}: {handle}")
+                else:
+                    print(f"Error getting {name}: object not found")
         
         # Test 1: Get current joint positions
         print("\n=== Current Joint Positions ===")
-        for i, handle in enumerate(joint_handles):
-            try:
-                position = sim.getJointPosition(handle)
+        ret, positions = zmq_connection.get_joint_positions(joint_handles)
+        if ret == 0:
+            for i, position in enumerate(positions):
                 print(f"Joint {i+1} position: {position}")
-            except Exception as e:
-                print(f"Error getting position for joint {i+1}: {e}")
         
         # Test 2: Try to move joints
         print("\n=== Testing Joint Movement ===")
         print("Moving joint 1 to position 0.5 radians...")
         try:
             sim.setJointTargetPosition(joint_handles[0], 0.5)
-            time.sleep(2)
+            advance(sim, 2, stepping)
             new_pos = sim.getJointPosition(joint_handles[0])
             print(f"New position of joint 1: {new_pos}")
         except Exception as e:
@@ -61,7 +79,7 @@ def test_robot_movement():
         print("Approach 1: Direct position setting...")
         try:
             sim.setJointPosition(joint_handles[0], 0.7)
-            time.sleep(1)
+            advance(sim, 1, stepping)
             pos = sim.getJointPosition(joint_handles[0])
             print(f"Position after direct setting: {pos}")
         except Exception as e:
@@ -71,7 +89,7 @@ def test_robot_movement():
         print("\nApproach 2: Target velocity...")
         try:
             sim.setJointTargetVelocity(joint_handles[0], 0.5)
-            time.sleep(1)
+            advance(sim, 1, stepping)
             sim.setJointTargetVelocity(joint_handles[0], 0)  # Stop
             pos = sim.getJointPosition(joint_handles[0])
             print(f"Position after velocity control: {pos}")
@@ -88,14 +106,15 @@ def test_robot_movement():
             '/my_cobot/gripper'
         ]
         
-        for name in possible_tip_names:
-            try:
-                handle = sim.getObject(name)
-                print(f"Found {name}: handle {handle}")
-                position = sim.getObjectPosition(handle, -1)
-                print(f"  Position: {position}")
-            except Exception as e:
-                pass  # Silently skip if not found
+        # Probe all names in one request; missing objects come back as -1 instead of raising
+        result = zmq_connection.get_object_handles(possible_tip_names)
+        if result["returnCode"] == 0:
+            found = [(name, handle) for name, handle in zip(possible_tip_names, result["handles"]) if handle >= 0]
+            positions = zmq_connection.get_object_positions([handle for _, handle in found])
+            if positions["returnCode"] == 0:
+                for (name, handle), position in zip(found, positions["positions"]):
+                    print(f"Found {name}: handle {handle}")
+                    print(f"  Position: {position}")
         
         # Test 5: Get all objects in scene to find the robot structure
         print("\n=== Getting All Objects in Scene ===")
@@ -114,12 +133,12 @@ def test_robot_movement():
                 '/my_cobot/link6'
             ]
             
-            for part in robot_parts:
-                try:
-                    handle = sim.getObject(part)
+            result = zmq_connection.get_object_handles(robot_parts)
+            if result["returnCode"] != 0:
+                raise Exception(result["error"])
+            for part, handle in zip(robot_parts, result["handles"]):
+                if handle >= 0:
                     print(f"Found {part}")
-                except:
-                    pass
         except Exception as e:
             print(f"Error listing objects: {e}")
         
@@ -133,7 +152,7 @@ def test_robot_movement():
             new_pos = current_pos.copy()
             new_pos[2] += 0.1  # Move up by 0.1
             sim.setObjectPosition(target_handle, -1, new_pos)
-            time.sleep(1)
+            advance(sim, 1, stepping)
             
             final_pos = sim.getObjectPosition(target_handle, -1)
             print(f"New target position: {final_pos}")
@@ -144,6 +163,9 @@ def test_robot_movement():
         print(f"Connection error: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        if stepping:
+            sim.setStepping(False)
 
 if __name__ == "__main__":
     test_robot_movement()
\ No newline at end of file
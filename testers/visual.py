@@ -4,44 +4,50 @@ from matplotlib.patches import Ellipse
 
 # Grid size (e.g., 20x20)
 grid_size = 200
-x = np.linspace(0, 20, grid_size)
-y = np.linspace(0, 20, grid_size)
+# float32 is plenty for display and halves the memory traffic of the grid math
+x = np.linspace(0, 20, grid_size, dtype=np.float32)
+y = np.linspace(0, 20, grid_size, dtype=np.float32)
 X, Y = np.meshgrid(x, y)
 
 # Define gaze direction mean (mu_g) and joystick direction mean (mu_j)
-mu_g = np.array([13, 8])  # gaze vector pointing toward this location
-mu_j = np.array([18, 4])  # joystick vector pointing toward this location
+mu_g = np.array([13, 8], dtype=np.float32)  # gaze vector pointing toward this location
+mu_j = np.array([18, 4], dtype=np.float32)  # joystick vector pointing toward this location
 
 # Define covariance matrices (uncertainty)
-sigma_g = np.array([[6, 0], [0, 6]])   # gaze uncertainty
-sigma_j = np.array([[8, 0], [0, 8]])   # joystick uncertainty
+sigma_g = np.array([[6, 0], [0, 6]], dtype=np.float32)   # gaze uncertainty
+sigma_j = np.array([[8, 0], [0, 8]], dtype=np.float32)   # joystick uncertainty
 
-# Define prior P(L) as uniform
-prior = np.ones_like(X)
+# Prior P(L) is uniform, so it only rescales the posterior
 
 # Gaussian probability density function
 def gaussian_2d(X, Y, mu, sigma):
-    pos = np.dstack((X, Y))
-    inv_sigma = np.linalg.inv(sigma)
-    diff = pos - mu
-    exponent = np.einsum('...k,kl,...l->...', diff, inv_sigma, diff)
-    return np.exp(-0.5 * exponent) / (2 * np.pi * np.sqrt(np.linalg.det(sigma)))
-
-# Likelihoods
-P_G_given_L = gaussian_2d(X, Y, mu_g, sigma_g)
-P_J_given_L = gaussian_2d(X, Y, mu_j, sigma_j)
-
-# Posterior (unnormalized)
-posterior = P_G_given_L * P_J_given_L * prior
-
-# Normalize posterior
-posterior /= np.sum(posterior)
+    # Closed-form inverse of the 2x2 covariance
+    a, b, c, d = sigma[0, 0], sigma[0, 1], sigma[1, 0], sigma[1, 1]
+    det = a * d - b * c
+    dx = X - mu[0]
+    dy = Y - mu[1]
+    exponent = (d * dx * dx - (b + c) * dx * dy + a * dy * dy) / det
+    np.exp(-0.5 * exponent, out=exponent)
+    exponent /= 2 * np.pi * np.sqrt(det)
+    return exponent
+
+# Product of two Gaussians in closed form: another Gaussian
+def fuse_gaussians(mu_1, sigma_1, mu_2, sigma_2):
+    info_1 = np.linalg.inv(sigma_1)
+    info_2 = np.linalg.inv(sigma_2)
+    sigma_post = np.linalg.inv(info_1 + info_2)
+    mu_post = sigma_post @ (info_1 @ mu_1 + info_2 @ mu_2)
+    return mu_post, sigma_post
+
+# Posterior P(L | G, J) is proportional to P(G | L) * P(J | L); only rasterized for display
+mu_post, sigma_post = fuse_gaussians(mu_g, sigma_g, mu_j, sigma_j)
+posterior = gaussian_2d(X, Y, mu_post, sigma_post)
 
 # Plotting
 fig, ax = plt.subplots(figsize=(12, 6))
 
 # Plot posterior heatmap
-heatmap = ax.imshow(posterior, extent=(0, 20, 0, 20), origin='lower', cmap='viridis')
+heatmap = ax.imshow(posterior, extent=(0, 20, 0, 20), origin='lower', cmap='viridis', vmin=0, vmax=posterior.max())
 ax.grid(True, color='white', linestyle='--', linewidth=0.5)
 ax.set_title('Probability of Object Location P(L | G, J)')
 ax.set_xlabel('X Position')
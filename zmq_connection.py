@@ -1,31 +1,169 @@
+import os
+import threading
+import functools
+import zmq
+import coppeliasim_zmqremoteapi_client as remote_api
 from coppeliasim_zmqremoteapi_client import RemoteAPIClient
 
+_clients_lock = threading.Lock()
+
+# ipc is only tried for these hosts, and only if the server answers within the probe timeout
+_LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+_IPC_PROBE_TIMEOUT_MS = 1000
+
+def _connect_socket(client, endpoint):
+    """Give the client a fresh REQ socket tuned for control traffic and connected to endpoint"""
+    socket = client.context.socket(zmq.REQ)
+    # Small queues and no linger for request/reply control traffic; these must be set before connecting
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.setsockopt(zmq.SNDHWM, 2)
+    socket.setsockopt(zmq.RCVHWM, 2)
+    socket.connect(endpoint)
+    client.socket = socket
+
+@functools.lru_cache(maxsize=None)
+def _get_client(ip, port, ipc_path):
+    """Create one Remote API client per server; returns (client, endpoint)"""
+    # The client always speaks CBOR but silently falls back to the much slower pure-Python 'cbor' package
+    if remote_api.cbor.__name__ != "cbor2":
+        print("Warning: cbor2 is not installed, Remote API messages are encoded with the slow 'cbor' fallback")
+    client = RemoteAPIClient(ip, port)
+    client.socket.close(linger=0)
+
+    # On the same (non-Windows) host, prefer the server's ipc endpoint when it has bound one
+    if ip in _LOOPBACK_HOSTS and ipc_path and os.name != "nt" and os.path.exists(ipc_path):
+        endpoint = f"ipc://{ipc_path}"
+        _connect_socket(client, endpoint)
+        # A socket file left behind by an exited simulator would block the first request forever
+        client.socket.setsockopt(zmq.RCVTIMEO, _IPC_PROBE_TIMEOUT_MS)
+        try:
+            client.call('sim.getSimulationState', [])
+            client.socket.setsockopt(zmq.RCVTIMEO, -1)
+            return client, endpoint
+        except zmq.Again:
+            print(f"No reply on {endpoint}, falling back to TCP")
+            client.socket.close(linger=0)
+            client.sendCnt = 0  # Resend the protocol header on the new socket
+
+    endpoint = f"tcp://{ip}:{port}"
+    _connect_socket(client, endpoint)
+    return client, endpoint
+
 class ZMQConnection:
-    def __init__(self, ip="127.0.0.1", port=23000):
-        self.client = RemoteAPIClient(ip, port)
+    def __init__(self, ip="127.0.0.1", port=23000, ipc_path="/tmp/coppelia.ipc", joint_mode="direct"):
+        # Connections to the same server share one client (and socket). Its REQ/REP exchange is not
+        # thread-safe, so all connections to one server must be used from a single thread
+        with _clients_lock:
+            self.client, endpoint = _get_client(ip, port, ipc_path)
         self.sim = self.client.getObject('sim')
-        print(f"Connected to CoppeliaSim ZMQ server at tcp://{ip}:{port}")
+        self.sandbox_script = self.sim.getScript(self.sim.scripttype_sandbox)
+        # Bind the remote methods used by the wrappers once instead of looking them up on every call
+        self._execute_script_string = self.sim.executeScriptString
+        self._get_object = self.sim.getObject
+        self._get_object_position = self.sim.getObjectPosition
+        self._set_object_position = self.sim.setObjectPosition
+        self._get_joint_position = self.sim.getJointPosition
+        # joint_mode "direct" sets joint positions, "target" sets the target of position-controlled joints
+        if joint_mode == "target":
+            self._set_joint_position = self.sim.setJointTargetPosition
+            self._lua_set_joint = "sim.setJointTargetPosition"
+        else:
+            self._set_joint_position = self.sim.setJointPosition
+            self._lua_set_joint = "sim.setJointPosition"
+        self._handle_cache = {}  # object name -> handle, see invalidate_handles()
+        print(f"Connected to CoppeliaSim ZMQ server at {endpoint}")
+
+    def execute_lua(self, code):
+        """Run a Lua snippet in the sandbox script and return its result in a single round-trip"""
+        _, value = self._execute_script_string(code, self.sandbox_script)
+        return value
 
     def get_object_handle(self, object_name):
         """Get object handle - wrapper for compatibility with old API style"""
+        handle = self._handle_cache.get(object_name)
+        if handle is not None:
+            return {"returnCode": 0, "handle": handle}
         try:
-            handle = self.sim.getObject(object_name)
+            handle = self._get_object(object_name)
+            self._handle_cache[object_name] = handle
             return {"returnCode": 0, "handle": handle}
         except Exception as e:
             return {"returnCode": -1, "error": str(e)}
 
+    def get_object_handles(self, object_names):
+        """Get handles of several objects with one request; missing objects get -1"""
+        # Only names that are not cached yet go to the server
+        missing = [name for name in dict.fromkeys(object_names) if name not in self._handle_cache]
+        if missing:
+            names = ",".join(f"'{name}'" for name in missing)
+            code = (
+                f"local handles={{}} "
+                f"for i,n in ipairs({{{names}}}) do handles[i]=sim.getObject(n,{{noError=true}}) end "
+                f"return handles"
+            )
+            try:
+                handles = list(self.execute_lua(code) or [])
+            except Exception as e:
+                return {"returnCode": -1, "error": str(e)}
+            for name, handle in zip(missing, handles):
+                # Like get_object_handle, lookups that failed are not cached
+                if handle >= 0:
+                    self._handle_cache[name] = handle
+        return {"returnCode": 0, "handles": [self._handle_cache.get(name, -1) for name in object_names]}
+
+    def invalidate_handles(self):
+        """Forget cached object handles, e.g. after the scene was reloaded"""
+        self._handle_cache.clear()
+
     def get_object_position(self, object_handle, reference_frame=-1):
         """Get object position - wrapper for compatibility with old API style"""
         try:
-            pos = self.sim.getObjectPosition(object_handle, reference_frame)
+            pos = self._get_object_position(object_handle, reference_frame)
             return {"returnCode": 0, "position": pos}
         except Exception as e:
             return {"returnCode": -1, "error": str(e)}
 
+    def get_object_positions(self, object_handles, reference_frame=-1):
+        """Get positions of several objects with one request instead of one per handle"""
+        handles = ",".join(str(int(handle)) for handle in object_handles)
+        code = (
+            f"local positions={{}} "
+            f"for i,h in ipairs({{{handles}}}) do positions[i]=sim.getObjectPosition(h,{int(reference_frame)}) end "
+            f"return positions"
+        )
+        try:
+            positions = self.execute_lua(code)
+            return {"returnCode": 0, "positions": list(positions or [])}
+        except Exception as e:
+            return {"returnCode": -1, "error": str(e)}
+
+    def find_indexed_objects(self, base_name, max_count=20):
+        """Find base_name[0], base_name[1], ... with their positions in one request.
+
+        Like a sequential scan, a missing index 0 is skipped but any later gap ends the search.
+        """
+        code = (
+            f"local found={{}} "
+            f"for i=0,{int(max_count) - 1} do "
+            f"local h=sim.getObject('{base_name}['..i..']',{{noError=true}}) "
+            f"if h>=0 then found[#found+1]={{i,h,sim.getObjectPosition(h,-1)}} elseif i>0 then break end "
+            f"end "
+            f"return found"
+        )
+        try:
+            found = self.execute_lua(code)
+            objects = [
+                {"name": f"{base_name}[{int(index)}]", "handle": handle, "position": position}
+                for index, handle, position in (found or [])
+            ]
+            return {"returnCode": 0, "objects": objects}
+        except Exception as e:
+            return {"returnCode": -1, "error": str(e)}
+
     def set_object_position(self, object_handle, reference_frame, position):
         """Set object position"""
         try:
-            self.sim.setObjectPosition(object_handle, reference_frame, position)
+            self._set_object_position(object_handle, reference_frame, position)
             return 0
         except Exception as e:
             print(f"Error setting object position: {e}")
@@ -34,20 +172,77 @@ class ZMQConnection:
     def get_joint_position(self, joint_handle):
         """Get joint position"""
         try:
-            pos = self.sim.getJointPosition(joint_handle)
+            pos = self._get_joint_position(joint_handle)
             return 0, pos
         except Exception as e:
             print(f"Error getting joint position: {e}")
             return -1, None
 
+    def get_joint_positions(self, joint_handles):
+        """Get positions of several joints with one request instead of one per joint"""
+        handles = ",".join(str(int(handle)) for handle in joint_handles)
+        code = (
+            f"local positions={{}} "
+            f"for i,h in ipairs({{{handles}}}) do positions[i]=sim.getJointPosition(h) end "
+            f"return positions"
+        )
+        try:
+            positions = self.execute_lua(code)
+            return 0, list(positions or [])
+        except Exception as e:
+            print(f"Error getting joint positions: {e}")
+            return -1, None
+
     def set_joint_position(self, joint_handle, position):
-        """Set joint position directly"""
+        """Set joint position (or its target, depending on joint_mode)"""
         try:
-            self.sim.setJointPosition(joint_handle, position)
+            self._set_joint_position(joint_handle, position)
             return 0
         except Exception as e:
             print(f"Error setting joint position: {e}")
             return -1
 
+    def set_joint_positions(self, joint_handles, positions):
+        """Set several joint positions with one request instead of one per joint"""
+        handles = ",".join(str(int(handle)) for handle in joint_handles)
+        values = ",".join(repr(float(position)) for position in positions)
+        code = (
+            f"local positions={{{values}}} "
+            f"for i,h in ipairs({{{handles}}}) do {self._lua_set_joint}(h,positions[i]) end"
+        )
+        try:
+            self.execute_lua(code)
+            return 0
+        except Exception as e:
+            print(f"Error setting joint positions: {e}")
+            return -1
+
     def disconnect(self):
-        print("Disconnected from ZMQ server")
\ No newline at end of file
+        print("Disconnected from ZMQ server")
+
+
+class SceneChangeListener:
+    """Subscribes to 'scene.changed' messages published by the scene and flags them in `changed`"""
+    def __init__(self, ip="127.0.0.1", port=23010, topic=b"scene.changed"):
+        self.socket = zmq.Context.instance().socket(zmq.SUB)
+        self.socket.connect(f"tcp://{ip}:{port}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, topic)
+        self.changed = threading.Event()
+        self.changed.set()  # Nothing has been loaded yet
+        self._running = True
+        self._thread = threading.Thread(target=self._listen, daemon=True)
+        self._thread.start()
+        print(f"Listening for scene changes at tcp://{ip}:{port}")
+
+    def _listen(self):
+        poller = zmq.Poller()
+        poller.register(self.socket, zmq.POLLIN)
+        while self._running:
+            if poller.poll(100):
+                self.socket.recv_multipart()
+                self.changed.set()
+        self.socket.close(linger=0)
+
+    def close(self):
+        self._running = False
+        self._thread.join(timeout=1.0)